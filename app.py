@@ -1,14 +1,24 @@
 import streamlit as st
 import pandas as pd
-import altair as alt
+import numpy as np
 import random
 import extra_streamlit_components as stx
 from datetime import datetime, time, timedelta
 
 import oracledb
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
 import base64
 import os
 import zipfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+FETCH_DAYS = 14
+FETCH_WORKERS = 8
+CACHE_DIR = "/tmp/gallery_cache"
+
 cookie_manager = stx.CookieManager()
 
 if "bookmarks" not in st.session_state:
@@ -103,39 +113,129 @@ def setup_oracle_wallet():
             
     return wallet_dir
 
-@st.cache_data(ttl=3600, show_spinner=False)
+@st.cache_resource
+def get_oracle_pool():
+    # 세션/재실행마다 TLS 핸드셰이크를 다시 하지 않도록 풀을 프로세스 단위로 재사용 (워커 수만큼 커넥션)
+    wallet_dir = setup_oracle_wallet()
+    return oracledb.create_pool(
+        user=st.secrets["ORACLE_DB_USER"],
+        password=st.secrets["ORACLE_DB_PASSWORD"],
+        dsn=st.secrets["ORACLE_DB_SERVICE"],
+        config_dir=wallet_dir,
+        wallet_location=wallet_dir,
+        wallet_password=st.secrets["ORACLE_WALLET_PASSWORD"],
+        min=1,
+        max=FETCH_WORKERS,
+        increment=1
+    )
+
+def split_day_ranges(start, end):
+    ranges = []
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(datetime.combine(chunk_start.date() + timedelta(days=1), time.min), end)
+        ranges.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+    return ranges
+
+def fetch_gallery_log(pool, start, end):
+    query = """
+        SELECT COLLECTION_TIME, NICKNAME, UID_IP, USER_TYPE, POST_COUNT, COMMENT_COUNT, TOTAL_COUNT
+        FROM GALLERY_LOG
+        WHERE COLLECTION_TIME >= :1 AND COLLECTION_TIME < :2
+        ORDER BY COLLECTION_TIME ASC
+    """
+
+    # 튜플 단위 fetchall 대신 드라이버에서 바로 Arrow 컬럼으로 받아옴
+    with pool.acquire() as connection:
+        odf = connection.fetch_df_all(
+            query,
+            [start.strftime("%Y-%m-%d %H:%M"), end.strftime("%Y-%m-%d %H:%M")],
+            arraysize=50000
+        )
+
+    return pa.table(odf)
+
+def fetch_day_stats(pool, start, end):
+    # COLLECTION_TIME은 'YYYY-MM-DD HH24:MI' 문자열 컬럼 -> 앞 10자리가 날짜 키
+    # 행 수만으로는 지난 행 수정을 못 잡으므로 TOTAL_COUNT 합계를 체크섬으로 같이 비교
+    query = """
+        SELECT SUBSTR(COLLECTION_TIME, 1, 10), COUNT(*), NVL(SUM(TOTAL_COUNT), 0)
+        FROM GALLERY_LOG
+        WHERE COLLECTION_TIME >= :1 AND COLLECTION_TIME < :2
+        GROUP BY SUBSTR(COLLECTION_TIME, 1, 10)
+    """
+
+    with pool.acquire() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(query, [start.strftime("%Y-%m-%d %H:%M"), end.strftime("%Y-%m-%d %H:%M")])
+            return {day: (int(rows), int(total)) for day, rows, total in cursor.fetchall()}
+
+def parse_collection_time(table):
+    # 문자열 수집시간 파싱을 워커 스레드에서 Arrow 캐스트로 처리 (GIL 해제 상태로 병렬 실행)
+    idx = table.schema.get_field_index('COLLECTION_TIME')
+    return table.set_column(idx, 'COLLECTION_TIME', pc.cast(table.column(idx), pa.timestamp('ns')))
+
+def day_stats(table):
+    return table.num_rows, pc.sum(pc.cast(table.column('TOTAL_COUNT'), pa.int64())).as_py() or 0
+
+def load_day_chunk(pool, start, end, expected_stats):
+    # 캐시 파일의 (행 수, TOTAL_COUNT 합계)가 DB의 해당 날짜 값과 같을 때만 재사용 (지난 날짜 보정/추가 반영)
+    # 비압축 Arrow 파일을 memory map으로 열어 디코딩/복사 없이 바로 붙임
+    cache_path = os.path.join(CACHE_DIR, f"{start:%Y-%m-%d}.arrow")
+    if os.path.exists(cache_path):
+        try:
+            cached_table = feather.read_table(cache_path, memory_map=True)
+            if day_stats(cached_table) == expected_stats:
+                return cached_table
+        except (pa.ArrowInvalid, OSError):
+            # 잘리거나 깨진 캐시 파일은 지우고 DB에서 다시 받음
+            os.remove(cache_path)
+
+    day_table = parse_collection_time(fetch_gallery_log(pool, start, end))
+
+    # 수집이 끝난 날짜만 디스크에 캐시 (오늘은 계속 쌓이는 중)
+    if end <= datetime.now() - timedelta(hours=1):
+        tmp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+        feather.write_feather(day_table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, cache_path)
+
+    return day_table
+
+# 인자가 없어 항목은 원래 1개뿐, max_entries=1은 그 상한을 명시만 함
+@st.cache_data(ttl=3600, max_entries=1, show_spinner=False)
 def load_data_from_oracle():
     try:
-        wallet_dir = setup_oracle_wallet()
-        
-        connection = oracledb.connect(
-            user=st.secrets["ORACLE_DB_USER"],
-            password=st.secrets["ORACLE_DB_PASSWORD"],
-            dsn=st.secrets["ORACLE_DB_SERVICE"],
-            config_dir=wallet_dir,
-            wallet_location=wallet_dir,
-            wallet_password=st.secrets["ORACLE_WALLET_PASSWORD"]
-        )
+        # 하루 단위로 쪼개서 병렬 조회 (지난 날짜는 디스크 캐시 사용)
+        pool = get_oracle_pool()
         
-        cutoff_date = datetime.now() - timedelta(days=14)
+        cutoff_date = datetime.now() - timedelta(days=FETCH_DAYS)
         cutoff_str = cutoff_date.strftime("%Y-%m-%d %H:%M")
+        end_date = datetime.combine(datetime.now().date() + timedelta(days=1), time.min)
+        ranges = split_day_ranges(datetime.combine(cutoff_date.date(), time.min), end_date)
         
-        query = """
-            SELECT COLLECTION_TIME, NICKNAME, UID_IP, USER_TYPE, POST_COUNT, COMMENT_COUNT, TOTAL_COUNT
-            FROM GALLERY_LOG
-            WHERE COLLECTION_TIME >= :1
-            ORDER BY COLLECTION_TIME ASC
-        """
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        cache_files = {f"{start:%Y-%m-%d}.arrow" for start, _ in ranges}
+        for name in os.listdir(CACHE_DIR):
+            if name.endswith((".arrow", ".parquet")) and name not in cache_files:
+                os.remove(os.path.join(CACHE_DIR, name))
         
-        with connection.cursor() as cursor:
-            cursor.arraysize = 50000
-            cursor.execute(query, [cutoff_str])
-            columns = [col[0] for col in cursor.description]
-            data = cursor.fetchall()
-            
-        connection.close()
+        day_stats_by_date = fetch_day_stats(pool, ranges[0][0], ranges[-1][1])
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+            day_tables = list(executor.map(
+                lambda r: load_day_chunk(pool, *r, day_stats_by_date.get(f"{r[0]:%Y-%m-%d}", (0, 0))),
+                ranges
+            ))
         
-        df = pd.DataFrame(data, columns=columns)
+        # Arrow 상태로 합친 뒤 한 번만 변환, 반복 groupby/검색 키는 category로 받음 (groupby 시 observed=True 필수)
+        # 변환 중 Arrow 버퍼를 바로 해제해 피크 메모리를 줄임 (day_tables 참조를 먼저 끊어야 해제됨)
+        table = pa.concat_tables(day_tables, promote_options='permissive')
+        del day_tables
+        df = table.to_pandas(categories=['NICKNAME', 'UID_IP', 'USER_TYPE'], split_blocks=True, self_destruct=True)
+        del table
+        for col in ['NICKNAME', 'UID_IP', 'USER_TYPE']:
+            # Arrow 사전은 등장 순서라 정렬 순서(닉네임순 등)가 맞도록 카테고리를 정렬
+            df[col] = df[col].cat.reorder_categories(df[col].cat.categories.sort_values())
         
         if df.empty:
             return pd.DataFrame()
@@ -151,9 +251,21 @@ def load_data_from_oracle():
         }, inplace=True)
         
         df['수집시간'] = pd.to_datetime(df['수집시간'])
-        df['작성글수'] = pd.to_numeric(df['작성글수'], errors='coerce').fillna(0).astype(int)
-        df['작성댓글수'] = pd.to_numeric(df['작성댓글수'], errors='coerce').fillna(0).astype(int)
-        df['총활동수'] = pd.to_numeric(df['총활동수'], errors='coerce').fillna(0).astype(int)
+        df = df[df['수집시간'] >= pd.Timestamp(cutoff_str)]
+        # 날짜 청크가 이미 시간순으로 이어붙여져 있으면 정렬 복사 생략
+        if not df['수집시간'].is_monotonic_increasing:
+            df = df.sort_values('수집시간', kind='stable')
+        df = df.reset_index(drop=True)
+        df['작성글수'] = pd.to_numeric(df['작성글수'], errors='coerce').fillna(0).astype('int32')
+        df['작성댓글수'] = pd.to_numeric(df['작성댓글수'], errors='coerce').fillna(0).astype('int32')
+        df['총활동수'] = pd.to_numeric(df['총활동수'], errors='coerce').fillna(0).astype('int32')
+        
+        # (닉네임, ID(IP), 유저타입) 조합별 유저 코드를 한 번만 만들어 두고 집계에서 공유 (값이 빠진 행은 NA)
+        user_codes = pd.factorize(build_user_keys(df))[0]
+        df['유저코드'] = pd.arrays.IntegerArray(user_codes.astype('int32'), user_codes < 0)
+        
+        # 하위 캐시 함수들이 df 전체를 해싱하지 않도록 로드마다 버전 토큰 부여
+        df.attrs['version'] = uuid.uuid4().hex
         
         return df
         
@@ -163,58 +275,126 @@ def load_data_from_oracle():
 
 
 # --- 차트 함수 ---
-def create_fixed_chart(chart_data, title_prefix=""):
-    base_df = chart_data.pivot(index='수집시간', columns='활동유형', values='카운트').reset_index()
-    base_df.columns.name = None 
+# Altair 객체 구성/검증 없이 Vega-Lite 스펙을 직접 작성 (재실행마다 수십 ms 절약)
+CHART_X_AXIS = {'field': '수집시간', 'type': 'temporal', 'axis': {'title': '시간', 'format': '%H시'}}
+
+CHART_TOOLTIP = [
+    {'field': '수집시간', 'type': 'temporal', 'title': '🕒 시간', 'format': '%H시'},
+    {'field': '액티브수', 'type': 'quantitative', 'title': '👥 액티브', 'format': ','},
+    {'field': '작성글수', 'type': 'quantitative', 'title': '📝 작성글', 'format': ','},
+    {'field': '작성댓글수', 'type': 'quantitative', 'title': '💬 작성댓글', 'format': ','}
+]
+
+def create_fixed_chart(trend_df, title_prefix=""):
+    # 넓은 형태(수집시간 + 지표 컬럼) 하나만 전달, 라인용 long-form은 fold 변환으로 브라우저에서 변환
+    metrics = [col for col in ['액티브수', '작성글수', '작성댓글수'] if col in trend_df.columns]
+    base_df = trend_df.reindex(columns=['수집시간', '액티브수', '작성글수', '작성댓글수'], fill_value=0)
+
+    lines = {
+        'transform': [{'fold': metrics, 'as': ['활동유형', '카운트']}],
+        'mark': {'type': 'line', 'point': True},
+        'encoding': {
+            'x': CHART_X_AXIS,
+            'y': {'field': '카운트', 'type': 'quantitative', 'title': '활동 수', 'scale': {'domainMin': 0, 'nice': True}},
+            'color': {
+                'field': '활동유형', 'type': 'nominal', 'legend': {'title': '지표'},
+                'scale': {'domain': ['액티브수', '작성글수', '작성댓글수'], 'range': ['red', 'green', 'blue']}
+            }
+        }
+    }
+
+    selectors = {
+        'name': 'selectors',
+        'mark': {'type': 'point'},
+        'encoding': {'x': CHART_X_AXIS, 'opacity': {'value': 0}, 'tooltip': CHART_TOOLTIP}
+    }
+
+    rules = {
+        'mark': {'type': 'rule', 'color': 'gray'},
+        'encoding': {
+            'x': CHART_X_AXIS,
+            'opacity': {'condition': {'param': 'nearest', 'empty': False, 'value': 0.5}, 'value': 0},
+            'tooltip': CHART_TOOLTIP
+        }
+    }
+
+    chart_spec = {
+        'height': 400,
+        'title': f"{title_prefix}",
+        'params': [{
+            'name': 'nearest',
+            'select': {'type': 'point', 'fields': ['수집시간'], 'nearest': True, 'on': 'mouseover'},
+            'views': ['selectors']
+        }],
+        'layer': [lines, selectors, rules]
+    }
+
+    return base_df, chart_spec
+
+
+# --- 집계 함수 ---
+def slice_time_window(df, selected_date, start_hour, end_hour):
+    # df는 수집시간 기준 정렬 상태 -> 이진 탐색으로 구간만 잘라냄
+    day_start = datetime.combine(selected_date, time.min)
+    lo = np.datetime64(day_start + timedelta(hours=start_hour))
+    hi = np.datetime64(day_start + timedelta(hours=end_hour))
     
-    for col in ['액티브수', '작성글수', '작성댓글수']:
-        if col not in base_df.columns:
-            base_df[col] = 0
-    base_df = base_df.fillna(0)
-
-    x_axis = alt.X('수집시간', axis=alt.Axis(title='시간', format='%H시'))
-
-    tooltip_config = [
-        alt.Tooltip('수집시간', title='🕒 시간', format='%H시'),
-        alt.Tooltip('액티브수', title='👥 액티브', format=','),
-        alt.Tooltip('작성글수', title='📝 작성글', format=','),
-        alt.Tooltip('작성댓글수', title='💬 작성댓글', format=',')
-    ]
-
-    lines = alt.Chart(chart_data).mark_line(point=True).encode(
-        x=x_axis,
-        y=alt.Y('카운트', title='활동 수', scale=alt.Scale(domainMin=0, nice=True)),
-        color=alt.Color('활동유형', legend=alt.Legend(title="지표"), 
-                        scale=alt.Scale(domain=['액티브수', '작성글수', '작성댓글수'], range=['red', 'green', 'blue']))
-    )
-
-    nearest = alt.selection_point(nearest=True, on='mouseover', fields=['수집시간'], empty=False)
-
-    selectors = alt.Chart(base_df).mark_point().encode(
-        x=x_axis,
-        opacity=alt.value(0), 
-        tooltip=tooltip_config 
-    ).add_params(
-        nearest
-    )
-
-    rules = alt.Chart(base_df).mark_rule(color='gray').encode(
-        x=x_axis,
-        opacity=alt.condition(nearest, alt.value(0.5), alt.value(0)),
-        tooltip=tooltip_config
-    )
-
-    final_chart = (lines + selectors + rules).properties(
-        height=400,
-        title=f"{title_prefix}"
-    )
-
-    return final_chart
+    i0, i1 = df['수집시간'].values.searchsorted([lo, hi])
+    return df.iloc[i0:i1]
+
+def build_user_keys(df):
+    # (닉네임, ID(IP), 유저타입) category 코드를 int64 하나로 합친 유저 키, 값이 빠진 행은 NA
+    nick, uid, user_type = (df[col].cat.codes.to_numpy().astype('int64') for col in ['닉네임', 'ID(IP)', '유저타입'])
+    valid = (nick >= 0) & (uid >= 0) & (user_type >= 0)
+    user_key = (nick << 42) | (uid << 21) | user_type
+    return pd.arrays.IntegerArray(user_key, ~valid)
+
+def count_unique_users(df):
+    # 로더에서 만든 유저코드의 유니크 개수만 셈 (GroupBy 객체 생성 없음, NA 제외)
+    return df['유저코드'].nunique()
+
+# 캐시 키는 data_version + 필터 값만 사용, 프레임 인자(_ 접두사)는 해싱하지 않음
+# 새로고침마다 data_version이 바뀌므로 max_entries로 지난 버전 결과가 계속 쌓이지 않게 제한
+@st.cache_data(show_spinner=False, max_entries=4)
+def build_time_trend(data_version, _df):
+    # df가 이미 수집시간순이라 sort=False여도 결과는 시간순, 합계와 액티브수를 groupby 한 번으로 집계
+    return _df.groupby('수집시간', sort=False).agg(
+        작성글수=('작성글수', 'sum'),
+        작성댓글수=('작성댓글수', 'sum'),
+        액티브수=('유저코드', 'nunique')
+    ).reset_index()
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def build_user_totals(data_version, selected_date, start_hour, end_hour, _filtered_df):
+    user_totals = _filtered_df.groupby(['닉네임', 'ID(IP)', '유저타입'], observed=True, sort=False)[['총활동수', '작성글수', '작성댓글수']].sum().reset_index()
+    
+    user_totals['총활동수'] = user_totals['총활동수'].astype(int)
+    user_totals['작성글수'] = user_totals['작성글수'].astype(int)
+    user_totals['작성댓글수'] = user_totals['작성댓글수'].astype(int)
+    return user_totals
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def build_user_list(data_version, selected_date, start_hour, end_hour, _filtered_df):
+    return build_user_totals(data_version, selected_date, start_hour, end_hour, _filtered_df).sort_values(by=['닉네임', 'ID(IP)'], ascending=True)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def build_search_index(data_version, selected_date, start_hour, end_hour, search_type, _user_list_df):
+    # 검색값 -> user_list_df 행 위치 (닉네임/ID는 행마다 유일하지 않음), 키 순서는 목록에 처음 나온 순서
+    codes, uniques = pd.factorize(_user_list_df[search_type])
+    order = np.argsort(codes, kind='stable')
+    positions = np.split(order, np.cumsum(np.bincount(codes))[:-1])
+    return dict(zip(uniques, positions))
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def build_daily_user_index(data_version, target_date, _df):
+    # (닉네임, ID(IP)) -> 해당 날짜 슬라이스 내 행 위치, 모달을 열 때마다 마스크를 만들지 않도록 날짜별 1회 생성
+    day_df = slice_time_window(_df, target_date, 0, 24)
+    return day_df.groupby(['닉네임', 'ID(IP)'], observed=True, sort=False).indices
 
 
 # --- 유저 상세 정보 모달 ---
 @st.dialog("👤 개인 그래프")
-def show_user_detail_modal(nick, user_id, user_type, raw_df, target_date):
+def show_user_detail_modal(nick, user_id, user_type, raw_df, data_version, target_date):
     is_bookmarked = nick in st.session_state.bookmarks
     
     col1, col2 = st.columns([0.8, 0.2])
@@ -234,37 +414,194 @@ def show_user_detail_modal(nick, user_id, user_type, raw_df, target_date):
     st.subheader(f"{nick} ({user_type})")
     st.caption(f"ID(IP): {user_id} | 기준일: {target_date}")
 
-    user_daily_df = raw_df[
-        (raw_df['수집시간'].dt.date == target_date) & 
-        (raw_df['닉네임'] == nick) & 
-        (raw_df['ID(IP)'] == user_id)
-    ]
+    day_df = slice_time_window(raw_df, target_date, 0, 24)
+    user_rows = build_daily_user_index(data_version, target_date, raw_df)
+    user_daily_df = day_df.iloc[user_rows.get((nick, user_id), [])]
 
     if user_daily_df.empty:
         st.warning("선택하신 날짜에 활동 데이터가 없습니다.")
         return
 
-    user_trend = user_daily_df.groupby('수집시간')[['작성글수', '작성댓글수']].sum().reset_index()
-    chart_data = user_trend.melt('수집시간', var_name='활동유형', value_name='카운트')
+    user_trend = user_daily_df.groupby('수집시간', sort=False)[['작성글수', '작성댓글수']].sum().reset_index()
     
-    chart = create_fixed_chart(chart_data, title_prefix=f"{nick}님의")
-    st.altair_chart(chart, width="stretch")
+    chart_df, chart_spec = create_fixed_chart(user_trend, title_prefix=f"{nick}님의")
+    st.vega_lite_chart(chart_df, chart_spec, width="stretch")
     
     u_posts = user_daily_df['작성글수'].sum()
     u_comments = user_daily_df['작성댓글수'].sum()
     st.info(f"📝 총 게시글: {u_posts}개 / 💬 총 댓글: {u_comments}개")
 
 
+# --- 탭 화면 (위젯 조작 시 해당 탭만 다시 실행) ---
+def highlight_bookmarked_rows(page_df):
+    # 북마크 행 전체를 노란 배경으로, 행마다 Python 함수를 부르지 않고 스타일 표를 한 번에 생성
+    row_styles = np.where(page_df['북마크'].to_numpy(dtype=bool), 'background-color: #FFFACD', '')
+    return pd.DataFrame(np.repeat(row_styles[:, None], page_df.shape[1], axis=1), index=page_df.index, columns=page_df.columns)
+
+@st.fragment
+def render_ranking_tab(df, filtered_df, data_version, selected_date, start_hour, end_hour):
+    st.subheader("Top 20")
+    st.caption("⭐ 북마크 , 📊 개인용 그래프")
+
+    ranking_df = build_user_totals(data_version, selected_date, start_hour, end_hour, filtered_df)
+
+    top_users = ranking_df.nlargest(20, '총활동수')
+    top_users = top_users.rename(columns={'유저타입': '계정타입'})
+
+    top_users.insert(0, '그래프보기', False)
+    top_users['북마크'] = top_users['닉네임'].isin(st.session_state.bookmarks)
+
+    top_users = top_users.sort_values(by=['북마크', '총활동수'], ascending=[False, False]).reset_index(drop=True)
+
+    cols = ['북마크', '그래프보기'] + [c for c in top_users.columns if c not in ['북마크', '그래프보기']]
+    top_users = top_users[cols]
+
+    styled_top_users = top_users.style.apply(highlight_bookmarked_rows, axis=None)
+
+    editor_key = "ranking_editor_v8"
+    st.data_editor(
+        styled_top_users,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "북마크": st.column_config.CheckboxColumn("    ⭐", help="체크 시 배경이 노란색으로 변합니다.", default=False),
+            "그래프보기": st.column_config.CheckboxColumn("    📊", help="체크 시 모달 창이 열립니다.", default=False),
+
+            "닉네임": st.column_config.TextColumn("닉네임"),
+            "ID(IP)": st.column_config.TextColumn("ID(IP)"),
+            "계정타입": st.column_config.TextColumn("타입"),
+            "작성글수": st.column_config.NumberColumn("글"),
+            "작성댓글수": st.column_config.NumberColumn("댓글"),
+            "총활동수": st.column_config.NumberColumn("총합")
+        },
+        disabled=[c for c in top_users.columns if c not in ['북마크', '그래프보기']],
+        key=editor_key
+    )
+
+    state = st.session_state.get(editor_key, {})
+    edited_rows = state.get("edited_rows", {})
+
+    if edited_rows:
+        for str_idx, changes in edited_rows.items():
+            idx = int(str_idx)
+            if idx < len(top_users):
+                clicked_nick = top_users.iloc[idx]['닉네임']
+                uid = top_users.iloc[idx]['ID(IP)']
+                account_type = top_users.iloc[idx]['계정타입']
+
+                if "북마크" in changes:
+                    is_checked = changes["북마크"]
+                    if is_checked and clicked_nick not in st.session_state.bookmarks:
+                        st.session_state.bookmarks.append(clicked_nick)
+                    elif not is_checked and clicked_nick in st.session_state.bookmarks:
+                        st.session_state.bookmarks.remove(clicked_nick)
+
+                    cookie_manager.set("user_bookmarks", ",".join(st.session_state.bookmarks))
+                    st.rerun()
+
+                if "그래프보기" in changes and changes["그래프보기"] == True:
+                    show_user_detail_modal(clicked_nick, uid, account_type, df, data_version, selected_date)
+
+
+@st.fragment
+def render_search_tab(df, filtered_df, data_version, selected_date, start_hour, end_hour):
+    st.subheader("전체 유저 목록")
+    st.caption("⭐ 북마크 , 📊 개인용 그래프")
+
+    user_list_df = build_user_list(data_version, selected_date, start_hour, end_hour, filtered_df)
+
+    col_search_type, col_search_input = st.columns([1.2, 4])
+
+    def clear_search_box():
+        if 'user_search_box' in st.session_state:
+            st.session_state.user_search_box = None
+
+    with col_search_type:
+        search_type = st.radio("검색 기준", ["닉네임", "ID(IP)"], horizontal=True, on_change=clear_search_box, label_visibility="collapsed")
+
+    with col_search_input:
+        search_index = build_search_index(data_version, selected_date, start_hour, end_hour, search_type, user_list_df)
+        options = list(search_index)
+        placeholder = "닉네임 입력" if search_type == "닉네임" else "ID(IP) 입력"
+        search_query = st.selectbox("검색어", options, index=None, placeholder=placeholder, key="user_search_box", label_visibility="collapsed")
+
+    target_df = user_list_df
+    if search_query:
+        target_df = target_df.iloc[search_index.get(search_query, [])]
+
+    if target_df.empty:
+        st.info("검색 결과가 없습니다.")
+    else:
+        page_df = target_df.rename(columns={'유저타입': '계정타입'})
+
+        page_df.insert(0, '그래프보기', False)
+        page_df['북마크'] = page_df['닉네임'].isin(st.session_state.bookmarks)
+        page_df = page_df.sort_values(by=['북마크', '닉네임'], ascending=[False, True]).reset_index(drop=True)
+
+        display_columns = ['북마크', '그래프보기', '닉네임', 'ID(IP)', '계정타입', '작성글수', '작성댓글수', '총활동수']
+        page_df = page_df[display_columns]
+
+        styled_page_df = page_df.style.apply(highlight_bookmarked_rows, axis=None)
+
+        editor_key = "search_editor_v8"
+        st.data_editor(
+            styled_page_df,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "북마크": st.column_config.CheckboxColumn("    ⭐", help="체크 시 배경이 노란색으로 변합니다.", default=False),
+                "그래프보기": st.column_config.CheckboxColumn("    📊", help="체크 시 모달 창이 열립니다.", default=False),
+                "닉네임": st.column_config.TextColumn("닉네임"),
+                "ID(IP)": st.column_config.TextColumn("ID(IP)"),
+                "계정타입": st.column_config.TextColumn("타입"),
+                "작성글수": st.column_config.NumberColumn("글"),
+                "작성댓글수": st.column_config.NumberColumn("댓글"),
+                "총활동수": st.column_config.NumberColumn("총합")
+            },
+            disabled=[c for c in page_df.columns if c not in ['북마크', '그래프보기']],
+            key=editor_key
+        )
+
+        state = st.session_state.get(editor_key, {})
+        edited_rows = state.get("edited_rows", {})
+
+        if edited_rows:
+            for str_idx, changes in edited_rows.items():
+                idx = int(str_idx)
+                if idx < len(page_df):
+                    clicked_nick = page_df.iloc[idx]['닉네임']
+                    uid = page_df.iloc[idx]['ID(IP)']
+                    account_type = page_df.iloc[idx]['계정타입']
+                    if "북마크" in changes:
+                        is_checked = changes["북마크"]
+                        if is_checked and clicked_nick not in st.session_state.bookmarks:
+                            st.session_state.bookmarks.append(clicked_nick)
+                        elif not is_checked and clicked_nick in st.session_state.bookmarks:
+                            st.session_state.bookmarks.remove(clicked_nick)
+
+                        cookie_manager.set("user_bookmarks", ",".join(st.session_state.bookmarks))
+                        st.rerun()
+
+                    # [이벤트 B] 📊 그래프 보기 체크
+                    if "그래프보기" in changes and changes["그래프보기"] == True:
+                        show_user_detail_modal(clicked_nick, uid, account_type, df, data_version, selected_date)
+
+
 # --- 메인 실행 ---
 loading_messages = ["☁️ 키보토스에 접속 중", "🏃‍♂️ 아로나가 달리고 있어요!", "🔍 케이가 분석 중", "💾 잠시만요!", "🤖 삐삐쀼쀼"]
 loading_text = random.choice(loading_messages)
 
+with st_space:
+    # 지난 날짜는 디스크 캐시라 강제 새로고침도 사실상 오늘 데이터만 다시 조회
+    if st.button("🔄", help="새로고침"):
+        load_data_from_oracle.clear()
+
 with st.spinner(loading_text):
     df = load_data_from_oracle()
 
 if not df.empty:
-    min_date = df['수집시간'].dt.date.min()
-    max_date = df['수집시간'].dt.date.max()
+    min_date = df['수집시간'].iloc[0].date()
+    max_date = df['수집시간'].iloc[-1].date()
 
     with st_date_col:
         selected_date = st.date_input("📅 날짜 선택", value=max_date, min_value=min_date, max_value=max_date)
@@ -272,19 +609,8 @@ if not df.empty:
     with st_time_col:
         start_hour, end_hour = st.slider("⏰ 시간대 필터", 0, 24, (0, 24), step=1, format="%d시")
 
-    day_filtered_df = df[df['수집시간'].dt.date == selected_date]
-    
-    if end_hour == 24:
-        filtered_df = day_filtered_df[day_filtered_df['수집시간'].dt.hour >= start_hour]
-        time_filter_end = datetime.combine(selected_date, time.max)
-    else:
-        filtered_df = day_filtered_df[
-            (day_filtered_df['수집시간'].dt.hour >= start_hour) & 
-            (day_filtered_df['수집시간'].dt.hour < end_hour)
-        ]
-        time_filter_end = datetime.combine(selected_date, time(end_hour, 0)) - timedelta(seconds=1)
-
-    time_filter_start = datetime.combine(selected_date, time(start_hour, 0))
+    data_version = df.attrs['version']
+    filtered_df = slice_time_window(df, selected_date, start_hour, end_hour)
 
     st.markdown("---")
 
@@ -302,9 +628,14 @@ if not df.empty:
         # [Tab 1] 시간 그래프
         # ==========================================
         if selected_tab == "시간대 그래프":
-            total_posts = filtered_df['작성글수'].sum()
-            total_comments = filtered_df['작성댓글수'].sum()
-            active_users = len(filtered_df.groupby(['닉네임', 'ID(IP)', '유저타입']))
+            full_trend_df = build_time_trend(data_version, df)
+            
+            visible_data = slice_time_window(full_trend_df, selected_date, start_hour, end_hour)
+
+            # 합계는 이미 시간대별로 집계된 visible_data에서, 유니크 유저 수만 원본 행 기준
+            total_posts = visible_data['작성글수'].sum()
+            total_comments = visible_data['작성댓글수'].sum()
+            active_users = count_unique_users(filtered_df)
 
             col1, col2, col3 = st.columns(3)
             col1.metric("📝 총 게시글", f"{total_posts:,}개")
@@ -314,198 +645,24 @@ if not df.empty:
             st.markdown("---")
             st.subheader("각 시간대 데이터")
 
-            trend_stats = df.groupby('수집시간')[['작성글수', '작성댓글수']].sum().reset_index()
-            trend_users = df.groupby(['수집시간', '닉네임', 'ID(IP)', '유저타입']).size().reset_index().groupby('수집시간').size().reset_index(name='액티브수')
-            full_trend_df = pd.merge(trend_stats, trend_users, on='수집시간', how='left').fillna(0)
-            
-            daily_data = full_trend_df[full_trend_df['수집시간'].dt.date == selected_date]
-
-            visible_data = daily_data[
-                (daily_data['수집시간'] >= time_filter_start) & 
-                (daily_data['수집시간'] <= time_filter_end)
-            ]
-
             if visible_data.empty:
                 st.warning("선택한 구간에 데이터가 없습니다.")
             else:
-                chart_data = visible_data.melt('수집시간', var_name='활동유형', value_name='카운트')
-                chart = create_fixed_chart(chart_data)
-                st.altair_chart(chart, width="stretch", key=f"main_chart_{selected_date}_{start_hour}_{end_hour}")
+                chart_df, chart_spec = create_fixed_chart(visible_data)
+                st.vega_lite_chart(chart_df, chart_spec, width="stretch", key=f"main_chart_{selected_date}_{start_hour}_{end_hour}")
 
 
         # ==========================================
         # [Tab 2] 유저 랭킹
         # ==========================================
         elif selected_tab == "유저 랭킹":
-            st.subheader("Top 20")
-            st.caption("⭐ 북마크 , 📊 개인용 그래프")
+            render_ranking_tab(df, filtered_df, data_version, selected_date, start_hour, end_hour)
 
-            ranking_df = filtered_df.groupby(['닉네임', 'ID(IP)', '유저타입'])[['총활동수', '작성글수', '작성댓글수']].sum().reset_index()
-            
-            ranking_df['총활동수'] = ranking_df['총활동수'].astype(int)
-            ranking_df['작성글수'] = ranking_df['작성글수'].astype(int)
-            ranking_df['작성댓글수'] = ranking_df['작성댓글수'].astype(int)
-
-            top_users = ranking_df.sort_values(by='총활동수', ascending=False).head(20)
-            top_users = top_users.rename(columns={'유저타입': '계정타입'})
-            
-            top_users.insert(0, '그래프보기', False)
-            top_users['북마크'] = top_users['닉네임'].apply(lambda x: True if x in st.session_state.bookmarks else False)
-            
-            top_users = top_users.sort_values(by=['북마크', '총활동수'], ascending=[False, False]).reset_index(drop=True)
-            
-            cols = ['북마크', '그래프보기'] + [c for c in top_users.columns if c not in ['북마크', '그래프보기']]
-            top_users = top_users[cols]
-            
-            def highlight_yellow(row):
-                if row['북마크'] == True:
-                    return ['background-color: #FFFACD'] * len(row)
-                return [''] * len(row)
-            
-            styled_top_users = top_users.style.apply(highlight_yellow, axis=1)
-
-            editor_key = "ranking_editor_v8"
-            st.data_editor(
-                styled_top_users,
-                use_container_width=True,
-                hide_index=True,
-                column_config={
-                    "북마크": st.column_config.CheckboxColumn("    ⭐", help="체크 시 배경이 노란색으로 변합니다.", default=False),
-                    "그래프보기": st.column_config.CheckboxColumn("    📊", help="체크 시 모달 창이 열립니다.", default=False),
-                    
-                    "닉네임": st.column_config.TextColumn("닉네임"),
-                    "ID(IP)": st.column_config.TextColumn("ID(IP)"),
-                    "계정타입": st.column_config.TextColumn("타입"),
-                    "작성글수": st.column_config.NumberColumn("글"),
-                    "작성댓글수": st.column_config.NumberColumn("댓글"),
-                    "총활동수": st.column_config.NumberColumn("총합")
-                },
-                disabled=[c for c in top_users.columns if c not in ['북마크', '그래프보기']],
-                key=editor_key
-            )
-
-            state = st.session_state.get(editor_key, {})
-            edited_rows = state.get("edited_rows", {})
-
-            if edited_rows:
-                for str_idx, changes in edited_rows.items():
-                    idx = int(str_idx)
-                    if idx < len(top_users):
-                        clicked_nick = top_users.iloc[idx]['닉네임']
-                        uid = top_users.iloc[idx]['ID(IP)']
-                        account_type = top_users.iloc[idx]['계정타입']
-
-                        if "북마크" in changes:
-                            is_checked = changes["북마크"]
-                            if is_checked and clicked_nick not in st.session_state.bookmarks:
-                                st.session_state.bookmarks.append(clicked_nick)
-                            elif not is_checked and clicked_nick in st.session_state.bookmarks:
-                                st.session_state.bookmarks.remove(clicked_nick)
-                            
-                            cookie_manager.set("user_bookmarks", ",".join(st.session_state.bookmarks))
-                            st.rerun()
-
-                        if "그래프보기" in changes and changes["그래프보기"] == True:
-                            show_user_detail_modal(clicked_nick, uid, account_type, df, selected_date)
-                    
-                    
         # ==========================================
         # [Tab 3] 유저 검색
         # ==========================================
         elif selected_tab == "유저 검색":
-            st.subheader("전체 유저 목록")
-            st.caption("⭐ 북마크 , 📊 개인용 그래프")
-
-            user_list_df = filtered_df.groupby(['닉네임', 'ID(IP)', '유저타입']).agg({
-                '작성글수': 'sum',
-                '작성댓글수': 'sum',
-                '총활동수': 'sum'
-            }).reset_index()
-
-            user_list_df['총활동수'] = user_list_df['총활동수'].astype(int)
-            user_list_df['작성글수'] = user_list_df['작성글수'].astype(int)
-            user_list_df['작성댓글수'] = user_list_df['작성댓글수'].astype(int)
-            user_list_df = user_list_df.sort_values(by='닉네임', ascending=True)
-
-            col_search_type, col_search_input = st.columns([1.2, 4])
-            
-            def clear_search_box():
-                if 'user_search_box' in st.session_state:
-                    st.session_state.user_search_box = None
-
-            with col_search_type:
-                search_type = st.radio("검색 기준", ["닉네임", "ID(IP)"], horizontal=True, on_change=clear_search_box, label_visibility="collapsed")
-
-            with col_search_input:
-                options = user_list_df['닉네임'].unique().tolist() if search_type == "닉네임" else user_list_df['ID(IP)'].unique().tolist()
-                placeholder = "닉네임 입력" if search_type == "닉네임" else "ID(IP) 입력"
-                search_query = st.selectbox("검색어", options, index=None, placeholder=placeholder, key="user_search_box", label_visibility="collapsed")
-
-            target_df = user_list_df
-            if search_query:
-                target_df = target_df[target_df['닉네임'] == search_query] if search_type == "닉네임" else target_df[target_df['ID(IP)'] == search_query]
-
-            if target_df.empty:
-                st.info("검색 결과가 없습니다.")
-            else:
-                page_df = target_df.rename(columns={'유저타입': '계정타입'})
-                
-                page_df.insert(0, '그래프보기', False)
-                page_df['북마크'] = page_df['닉네임'].apply(lambda x: True if x in st.session_state.bookmarks else False)
-                page_df = page_df.sort_values(by=['북마크', '닉네임'], ascending=[False, True]).reset_index(drop=True)
-
-                display_columns = ['북마크', '그래프보기', '닉네임', 'ID(IP)', '계정타입', '작성글수', '작성댓글수', '총활동수']
-                page_df = page_df[display_columns]
-
-                def highlight_yellow_search(row):
-                    if row['북마크'] == True:
-                        return ['background-color: #FFFACD'] * len(row)
-                    return [''] * len(row)
-                
-                styled_page_df = page_df.style.apply(highlight_yellow_search, axis=1)
-
-                editor_key = "search_editor_v8"
-                st.data_editor(
-                    styled_page_df,
-                    use_container_width=True,
-                    hide_index=True,
-                    column_config={
-                        "북마크": st.column_config.CheckboxColumn("    ⭐", help="체크 시 배경이 노란색으로 변합니다.", default=False),
-                        "그래프보기": st.column_config.CheckboxColumn("    📊", help="체크 시 모달 창이 열립니다.", default=False),
-                        "닉네임": st.column_config.TextColumn("닉네임"),
-                        "ID(IP)": st.column_config.TextColumn("ID(IP)"),
-                        "계정타입": st.column_config.TextColumn("타입"),
-                        "작성글수": st.column_config.NumberColumn("글"),
-                        "작성댓글수": st.column_config.NumberColumn("댓글"),
-                        "총활동수": st.column_config.NumberColumn("총합")
-                    },
-                    disabled=[c for c in page_df.columns if c not in ['북마크', '그래프보기']],
-                    key=editor_key
-                )
-
-                state = st.session_state.get(editor_key, {})
-                edited_rows = state.get("edited_rows", {})
-
-                if edited_rows:
-                    for str_idx, changes in edited_rows.items():
-                        idx = int(str_idx)
-                        if idx < len(page_df):
-                            clicked_nick = page_df.iloc[idx]['닉네임']
-                            uid = page_df.iloc[idx]['ID(IP)']
-                            account_type = page_df.iloc[idx]['계정타입']
-                            if "북마크" in changes:
-                                is_checked = changes["북마크"]
-                                if is_checked and clicked_nick not in st.session_state.bookmarks:
-                                    st.session_state.bookmarks.append(clicked_nick)
-                                elif not is_checked and clicked_nick in st.session_state.bookmarks:
-                                    st.session_state.bookmarks.remove(clicked_nick)
-                                
-                                cookie_manager.set("user_bookmarks", ",".join(st.session_state.bookmarks))
-                                st.rerun()
-
-                            # [이벤트 B] 📊 그래프 보기 체크
-                            if "그래프보기" in changes and changes["그래프보기"] == True:
-                                show_user_detail_modal(clicked_nick, uid, account_type, df, selected_date)
+            render_search_tab(df, filtered_df, data_version, selected_date, start_hour, end_hour)
 
 else:
     st.info("데이터 로딩 중... (데이터가 없거나 DB 연결을 확인해주세요)")